@@ -0,0 +1,18 @@
+import os
+import pytest
+
+try:
+    from sheet_music_player import SheetMusicPlayer
+except ImportError:
+    # Without the image processing dependencies there is nothing to check
+    collect_ignore_glob = ["test_*.py"]
+
+
+@pytest.fixture(scope="session")
+def player():
+    return SheetMusicPlayer(show_previews=False, enable_audio=False)
+
+
+@pytest.fixture(scope="session")
+def test_cases_dir():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_cases")
@@ -1,7 +1,6 @@
 import string
 import cv2
 import numpy as np
-import fluidsynth
 import os
 import time
 from typing import List, Tuple, Dict, Optional
@@ -15,15 +14,18 @@ class SheetMusicPlayer:
     Supports whole notes, half notes, quarter notes, eighth notes, and sixteenth notes.
     """
     
-    def __init__(self, soundfont: str = None):
+    def __init__(self, soundfont: str = None, show_previews: bool = True, enable_audio: bool = True):
         """
         Initialize the sheet music player.
         
         Args:
             soundfont_path: Path to a SoundFont file (.sf2). If None, will try to use default.
+            show_previews: Whether to open preview windows while processing. Disable for batch jobs.
+            enable_audio: Whether to start FluidSynth. Disable when only detecting notes.
         """
         self.fs = None
         self.soundfont_path = soundfont
+        self.show_previews = show_previews
         self.note_durations = {
             'whole': 4.0,
             'half': 2.0,
@@ -40,7 +42,8 @@ class SheetMusicPlayer:
         }
         
         self.setup_logging()
-        self.initialize_fluidsynth()
+        if enable_audio:
+            self.initialize_fluidsynth()
     
     def setup_logging(self):
         """Setup logging configuration."""
@@ -53,6 +56,9 @@ class SheetMusicPlayer:
     def initialize_fluidsynth(self):
         """Initialize FluidSynth with a SoundFont."""
         try:
+            # Imported here so note detection works on machines without the FluidSynth library
+            import fluidsynth
+
             self.fs = fluidsynth.Synth()
             self.fs.start()
             
@@ -82,10 +88,60 @@ class SheetMusicPlayer:
             self.fs = None
 
     def preview_image(self, image: np.ndarray, name: string="image.png"):
+        if not self.show_previews:
+            return
         cv2.imshow(name, image)
         cv2.waitKey(0)
         cv2.destroyAllWindows()
-    
+
+    def binarize_image(self, image: np.ndarray, window_size: int = None, k: float = 0.2,
+                       dynamic_range: float = 128.0, min_speck_area: int = 8) -> np.ndarray:
+        """
+        Binarize the sheet music with Sauvola local thresholds computed from integral images.
+
+        Args:
+            image: Sheet music image (BGR or grayscale)
+            window_size: Side of the square neighbourhood. If None, it is derived from the image size.
+            k: Sauvola sensitivity; higher values keep less ink
+            dynamic_range: Dynamic range of the standard deviation (128 for 8-bit images)
+            min_speck_area: Ink blobs with fewer pixels are dropped, so sensor noise in shadows does not turn into contours
+
+        Returns:
+            Binary image with ink as 255 and background as 0
+        """
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        height, width = gray.shape
+
+        # The window has to be much larger than a note head, otherwise solid heads wash out
+        if window_size is None:
+            window_size = max(31, max(height, width) // 16)
+        window_size |= 1
+        half = window_size // 2
+
+        # Pad so every pixel has a full window, then get sums and squared sums in one pass
+        padded = cv2.copyMakeBorder(gray, half, half, half, half, cv2.BORDER_REFLECT)
+        sums, squared_sums = cv2.integral2(padded, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+
+        def window_total(table: np.ndarray) -> np.ndarray:
+            return (table[window_size:window_size + height, window_size:window_size + width]
+                    - table[:height, window_size:window_size + width]
+                    - table[window_size:window_size + height, :width]
+                    + table[:height, :width])
+
+        area = float(window_size * window_size)
+        mean = window_total(sums) / area
+        variance = np.maximum(window_total(squared_sums) / area - mean * mean, 0)
+        threshold = mean * (1 + k * (np.sqrt(variance) / dynamic_range - 1))
+
+        binary = np.where(gray < threshold, 255, 0).astype(np.uint8)
+
+        # Drop noise specks in one labelling pass instead of letting them reach the contour loops
+        _, labels, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        keep = stats[:, cv2.CC_STAT_AREA] >= min_speck_area
+        keep[0] = False
+
+        return np.where(keep[labels], 255, 0).astype(np.uint8)
+
     # def preprocess_image(self, image_path: str, save_preview: bool = False) -> np.ndarray:
     #     """
     #     Preprocess the sheet music image for better note detection.
@@ -154,26 +210,19 @@ class SheetMusicPlayer:
         
     #     return cleaned
     
-    def detect_staff_lines(self, image: np.ndarray) -> List[Dict]:
+    def detect_staff_lines(self, image: np.ndarray, binary: np.ndarray = None) -> List[Dict]:
         """
-        Detect horizontal staff lines in the sheet music by color.
+        Detect horizontal staff lines in the sheet music.
         
         Args:
             image: Original sheet music image
+            binary: Output of binarize_image for this image. Computed here if None.
             
         Returns:
             List of staff line dictionaries with coordinates
         """
-        # Convert to HSV for better color detection
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        
-        # Define range for black/dark lines (staff lines are usually black)
-        # You can adjust these values based on your image
-        lower_black = np.array([0, 0, 0])
-        upper_black = np.array([180, 255, 50])
-        
-        # Create mask for dark lines
-        mask = cv2.inRange(hsv, lower_black, upper_black)
+        # Dark pixels from the locally thresholded image
+        mask = binary if binary is not None else self.binarize_image(image)
         self.preview_image(mask, "mask")
         
         # Find horizontal lines using morphological operations
@@ -255,8 +304,85 @@ class SheetMusicPlayer:
             return resized_image, new_staff_lines
 
         return original_image, staff_lines
+
+    def preprocess_page(self, original_image: np.ndarray) -> Tuple[np.ndarray, np.ndarray, List[Dict]]:
+        """
+        Run everything before symbol extraction: binarization, staff detection and staff height normalization.
+        
+        Args:
+            original_image: Original sheet music image
+            
+        Returns:
+            Resized image, its binary image and the resized staff line dictionaries
+            OR
+            Original image, its binary image and the unscaled staff lines if there are not exactly 5
+        """
+        # Binarize once and share the result between staff and note detection
+        binary = self.binarize_image(original_image)
+
+        staff_lines = self.detect_staff_lines(original_image, binary)
+        if not staff_lines:
+            return original_image, binary, []
+
+        # Resizing needs a full staff to measure
+        if len(staff_lines) != 5:
+            return original_image, binary, staff_lines
+
+        resized_image, resized_staff_lines = self.resize_by_staff_height(original_image, staff_lines)
+        if resized_image.shape[:2] != binary.shape:
+            binary = cv2.resize(binary, (resized_image.shape[1], resized_image.shape[0]), interpolation=cv2.INTER_LINEAR)
+            _, binary = cv2.threshold(binary, 127, 255, cv2.THRESH_BINARY)
+
+        return resized_image, binary, resized_staff_lines
+
+    def remove_staff_lines(self, binary: np.ndarray, staff_lines: List[Dict]) -> np.ndarray:
+        """
+        Erase staff line pixels from a binary image while keeping the symbols that cross them.
+        
+        Args:
+            binary: Binary image with ink as 255
+            staff_lines: The array of staff line dictionaries calculated by detect_staff_lines
+            
+        Returns:
+            Copy of the binary image with the staff lines removed
+        """
+        removed = binary.copy()
+        rows, cols = removed.shape
+
+        staff_ys = [line["y"] for line in staff_lines]
+        head_width = max(int((max(staff_ys) - min(staff_ys)) / 4), 1) if staff_ys else 1
+
+        for line in staff_lines:
+            # Rows covered by the line, padded by a pixel for anti-aliased edges
+            thickness = max(line["height"], 1)
+            top = max(line["y"] - thickness // 2 - 1, 0)
+            bottom = min(line["y"] - thickness // 2 + thickness + 1, rows)
+            x1, x2 = max(line["x1"], 0), min(line["x2"], cols)
+
+            # Length of the unbroken vertical ink run leaving the line upwards and downwards in each column
+            reach = 2 * thickness
+            above = removed[max(top - reach, 0):top, x1:x2][::-1] > 0
+            below = removed[bottom:bottom + reach, x1:x2] > 0
+            run_above = np.cumprod(above, axis=0).sum(axis=0) if above.size else 0
+            run_below = np.cumprod(below, axis=0).sum(axis=0) if below.size else 0
+
+            # A column only belongs to the line if its ink run is about as tall as the line itself
+            crossed = (run_above + run_below) > 1
+
+            # The arc of a hollow head lying on the line has no run of its own, but the head's walls leave
+            # the line on one side only. Bridge gaps narrower than a head between such one-sided columns;
+            # stems and bar lines cross to both sides, so the line between them is still erased
+            one_sided = ((run_above > 1) != (run_below > 1)).astype(np.uint8)[None, :]
+            arcs = cv2.morphologyEx(one_sided, cv2.MORPH_CLOSE, np.ones((1, head_width), np.uint8))[0] > 0
+            kept = (crossed | arcs).astype(np.uint8)[None, :]
+            kept = cv2.dilate(kept, np.ones((1, 3), np.uint8))[0] > 0
+
+            removed[top:bottom, x1:x2][:, ~kept] = 0
+
+        return removed
     
-    def detect_notes_by_intersection(self, image_name: str, image: np.ndarray, staff_lines: List[Dict], save_preview: bool = False) -> List[Dict]:
+    def detect_notes_by_intersection(self, image_name: str, image: np.ndarray, staff_lines: List[Dict], save_preview: bool = False,
+                                     binary: np.ndarray = None) -> List[Dict]:
         """
         Detect musical notes by checking intersections with staff lines.
         
@@ -264,32 +390,36 @@ class SheetMusicPlayer:
             image: Sheet music image
             staff_lines: List of staff line dictionaries
             save_preview: Whether to save the visualization detection image
+            binary: Output of binarize_image for this image. Computed here if None.
             
         Returns:
             List of detected notes with their properties
         """
         notes = []
 
-        # Convert to grayscale for better note detection
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-        # Apply threshold to get binary image
-        _, binary = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY_INV)
-        
-        # Use the binary image directly - we'll filter contours instead
-        note_heads = binary.copy()
+        # Get binary image with ink as 255
+        if binary is None:
+            binary = self.binarize_image(image)
         
-        # Also create a version that detects hollow circles (whole notes)
-        # Use morphological operations to find circular shapes
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (7, 7))
-        hollow_circles = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
+        # Remove the staff lines so note heads become small, isolated blobs
+        note_heads = self.remove_staff_lines(binary, staff_lines)
         
-        # Find contours of potential notes (both filled and hollow)
-        contours_filled, _ = cv2.findContours(note_heads, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        contours_hollow, _ = cv2.findContours(hollow_circles, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # Fill hollow note heads (whole and half notes) so they look like solid ones
+        symbols, _ = cv2.findContours(note_heads, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        filled_heads = np.zeros_like(note_heads)
+        cv2.drawContours(filled_heads, symbols, -1, 255, -1)
+
+        # Open with a kernel wider than stems, flags and text strokes so only note heads are left
+        # The local threshold draws strokes a pixel thicker than a global one, hence 9x9
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (9, 9))
+        head_candidates = cv2.morphologyEx(filled_heads, cv2.MORPH_OPEN, kernel)
+
+        # Supported notes reach two spaces above the top line (C6), so nothing further away needs checking
+        staff_ys = [line["y"] for line in staff_lines]
+        max_staff_distance = 2.5 * (max(staff_ys) - min(staff_ys)) / 4 if staff_ys else 0
         
-        # Combine both sets of contours
-        contours = contours_filled + contours_hollow
+        # Find contours of potential notes, one per head
+        contours, _ = cv2.findContours(head_candidates, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
         # Create visualization image
         vis_image = image.copy()
@@ -308,6 +438,9 @@ class SheetMusicPlayer:
             # Also look for smaller objects that might be note heads
             is_note_head = ((15 < w < 125 and 10 < h < 125 and 0.4 < aspect_ratio < 2.5 and w * h > 20) or
                            (15 < w < 125 and 10 < h < 125 and 0.5 < aspect_ratio < 2.0 and w * h > 50))
+
+            # An elliptical head covers about pi/4 of its bounding box; time signature digits and clef pieces cover much less
+            is_note_head = is_note_head and cv2.contourArea(contour) / (w * h) > 0.6
             
             if is_note_head:
                 # Check if this contour intersects with any staff line
@@ -329,7 +462,7 @@ class SheetMusicPlayer:
                         distance = abs(note_center_y - line_y)
                         
                         # Find the closest staff line within reasonable distance
-                        if distance < min_distance and distance < 300:  # Much more tolerant
+                        if distance < min_distance and distance < max_staff_distance:
                             min_distance = distance
                             intersecting_line = staff_line
                 
@@ -498,23 +631,20 @@ class SheetMusicPlayer:
             if original_image is None:
                 raise ValueError(f"Could not read image: {image_path}")
             
-            # Detect staff lines
-            staff_lines = self.detect_staff_lines(original_image)
+            # Binarize, detect staff lines and resize based on staff size
+            resized_image, binary, staff_lines = self.preprocess_page(original_image)
             if not staff_lines:
                 self.logger.error("No staff lines detected")
                 return
-
-            # Resize image based on staff size
-            resized_image, resized_staff_lines = self.resize_by_staff_height(original_image, staff_lines)
             
-            self.logger.info(f"Detected {len(resized_staff_lines)} staff lines")
+            self.logger.info(f"Detected {len(staff_lines)} staff lines")
 
             if len(staff_lines) != 5:
                 self.logger.error("Invalid sheet music format")
                 return
 
             # Detect notes by intersection
-            notes = self.detect_notes_by_intersection(image_name, resized_image, staff_lines, save_preview)
+            notes = self.detect_notes_by_intersection(image_name, resized_image, staff_lines, save_preview, binary)
 
             if not notes:
                 self.logger.error("No notes detected")
@@ -0,0 +1,152 @@
+import json
+import os
+import cv2
+import numpy as np
+from typing import List, Tuple, Dict
+from sheet_music_player import SheetMusicPlayer
+
+
+class StaffCorpus:
+    """
+    Read-only view of preprocessed staff bands stored on disk.
+
+    A corpus is two files sharing a path prefix:
+        <prefix>.bands  raw uint8 binary staff bands, concatenated row-major
+        <prefix>.json   index with the source path, offset, shape, page row and staff lines of every band
+
+    Bands are sliced straight out of a memory map, so reading one costs no decode,
+    no preprocessing and no copy. Open one StaffCorpus per worker process.
+    """
+
+    def __init__(self, corpus_path: str):
+        """
+        Open an existing corpus.
+
+        Args:
+            corpus_path: Path prefix the corpus was written to
+        """
+        with open(f"{corpus_path}.json", "r", encoding="utf-8") as fh:
+            self.pages = json.load(fh)["pages"]
+
+        self.data = np.memmap(f"{corpus_path}.bands", dtype=np.uint8, mode="r") if self.pages else None
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def __getitem__(self, index: int) -> Tuple[np.ndarray, List[Dict]]:
+        """
+        Get a staff band without copying it.
+
+        Args:
+            index: Position of the page in the corpus
+
+        Returns:
+            Binary staff band (ink as 255) and its staff line dictionaries
+        """
+        page = self.pages[index]
+        height, width = page["shape"]
+        band = self.data[page["offset"]:page["offset"] + height * width].reshape(height, width)
+
+        # Staff lines are mutated by later stages, so hand out fresh dictionaries
+        return band, [dict(line) for line in page["staff_lines"]]
+
+    def detect_notes(self, player: SheetMusicPlayer, index: int) -> List[Dict]:
+        """
+        Rerun only the symbol stage on a stored staff band.
+
+        Args:
+            player: Configured player, usually created with show_previews=False and enable_audio=False
+            index: Position of the page in the corpus
+
+        Returns:
+            List of detected notes with coordinates relative to the staff band (add band_top from the index for page rows)
+        """
+        band, staff_lines = self[index]
+
+        # Note detection draws its visualization on a color image
+        image = cv2.cvtColor(cv2.bitwise_not(band), cv2.COLOR_GRAY2BGR)
+
+        image_name = os.path.basename(self.pages[index]["image"])
+
+        return player.detect_notes_by_intersection(image_name, image, staff_lines, False, band)
+
+
+def crop_staff_band(binary: np.ndarray, staff_lines: List[Dict]) -> Tuple[np.ndarray, List[Dict], int]:
+    """
+    Crop a binary page down to the rows that can hold notes of its staff.
+
+    Args:
+        binary: Normalized binary page from SheetMusicPlayer.preprocess_page
+        staff_lines: Normalized staff line dictionaries for the page
+
+    Returns:
+        Contiguous staff band, staff line dictionaries relative to it and the page row the band starts at
+    """
+    staff_ys = [line["y"] for line in staff_lines]
+    staff_spacing = (max(staff_ys) - min(staff_ys)) / 4
+
+    # Three spaces of margin covers C6 above the staff and C4 below it
+    top = max(int(min(staff_ys) - 3 * staff_spacing), 0)
+    bottom = min(int(max(staff_ys) + 3 * staff_spacing) + 1, binary.shape[0])
+
+    # Grow the band so no symbol reaching into it is cut, e.g. stems and flags rising above the staff.
+    # Note detection then sees the same blobs as it does on the full page
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    component_tops = stats[1:, cv2.CC_STAT_TOP]
+    component_bottoms = component_tops + stats[1:, cv2.CC_STAT_HEIGHT]
+    reaching = (component_tops < bottom) & (component_bottoms > top)
+    if reaching.any():
+        top = min(top, int(component_tops[reaching].min()))
+        bottom = max(bottom, int(component_bottoms[reaching].max()))
+
+    band = np.ascontiguousarray(binary[top:bottom])
+    band_lines = [dict(line, y=line["y"] - top) for line in staff_lines]
+
+    return band, band_lines, top
+
+
+def write_staff_corpus(player: SheetMusicPlayer, image_paths: List[str], corpus_path: str) -> int:
+    """
+    Preprocess sheet music images once and store their staff bands as a corpus.
+
+    Args:
+        player: Player used for preprocessing, usually created with show_previews=False and enable_audio=False
+        image_paths: Paths to the sheet music images
+        corpus_path: Path prefix for the .bands and .json files
+
+    Returns:
+        Number of pages written
+    """
+    pages = []
+    offset = 0
+
+    with open(f"{corpus_path}.bands", "wb") as data_file:
+        for image_path in image_paths:
+            original_image = cv2.imread(image_path)
+            if original_image is None:
+                player.logger.warning(f"Could not read image: {image_path}")
+                continue
+
+            _, binary, staff_lines = player.preprocess_page(original_image)
+            if len(staff_lines) != 5:
+                player.logger.warning(f"Skipping {image_path}: invalid sheet music format")
+                continue
+
+            band, band_lines, band_top = crop_staff_band(binary, staff_lines)
+            data_file.write(band.tobytes())
+
+            pages.append({
+                "image": image_path,
+                "offset": offset,
+                "shape": list(band.shape),
+                "band_top": band_top,
+                "staff_lines": band_lines
+            })
+            offset += band.size
+
+    with open(f"{corpus_path}.json", "w", encoding="utf-8") as fh:
+        json.dump({"pages": pages}, fh)
+
+    player.logger.info(f"Wrote {len(pages)} staff bands to {corpus_path}.bands")
+
+    return len(pages)
@@ -0,0 +1,55 @@
+import os
+import cv2
+import numpy as np
+
+
+def uneven_page(height: int = 1500, width: int = 2400) -> np.ndarray:
+    """Synthetic phone photo: one staff of notes under a strong shadow with sensor noise."""
+    rng = np.random.default_rng(0)
+    shade = np.linspace(250, 90, width)[None, :] * np.linspace(1.0, 0.8, height)[:, None]
+    page = shade + rng.normal(0, 8, (height, width))
+
+    for i in range(5):
+        y = 600 + 30 * i
+        page[y:y + 3, 100:width - 100] -= 80
+    for x in range(300, width - 200, 150):
+        cv2.circle(page, (x, 645), 13, 0, -1)
+
+    return cv2.cvtColor(np.clip(page, 0, 255).astype(np.uint8), cv2.COLOR_GRAY2BGR)
+
+
+def test_uneven_page_keeps_contour_count_bounded(player):
+    image = uneven_page()
+
+    binary = player.binarize_image(image)
+
+    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    _, global_binary = cv2.threshold(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), 127, 255, cv2.THRESH_BINARY_INV)
+    global_contours, _ = cv2.findContours(global_binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    # A fixed threshold floods the shadow with thousands of noise blobs
+    assert len(global_contours) > 1000
+    assert len(contours) < 50
+    assert len(player.detect_staff_lines(image, binary)) == 5
+
+
+def test_faint_scan_keeps_its_ink(player, test_cases_dir):
+    # Yellowed scan: grey ink on dark paper, entirely above the old global threshold of 127
+    gray = cv2.cvtColor(cv2.imread(os.path.join(test_cases_dir, "c-major.png")), cv2.COLOR_BGR2GRAY)
+    faint = (140 + gray.astype(np.float64) / 255 * 60).astype(np.uint8)
+    image = cv2.cvtColor(faint, cv2.COLOR_GRAY2BGR)
+
+    resized_image, binary, staff_lines = player.preprocess_page(image)
+    notes = player.detect_notes_by_intersection("c-major.png", resized_image, staff_lines, False, binary)
+
+    assert len(staff_lines) == 5
+    assert [note["note"] for note in notes] == ["C4", "D4", "E4", "F4", "G4", "A4", "B4", "C5"]
+
+
+def test_rock_reads_every_note_head(player, test_cases_dir):
+    image = cv2.imread(os.path.join(test_cases_dir, "rock.png"))
+    resized_image, binary, staff_lines = player.preprocess_page(image)
+
+    notes = player.detect_notes_by_intersection("rock.png", resized_image, staff_lines, False, binary)
+
+    assert [note["note"] for note in notes if note["duration"] == "quarter"] == ["E4", "G4", "E5", "C5"]
@@ -0,0 +1,52 @@
+import json
+import os
+import cv2
+import numpy as np
+
+from staff_corpus import StaffCorpus, write_staff_corpus
+
+
+def summarize(notes, row_offset=0):
+    return [(note["note"], note["duration"], note["x"], note["y"] + row_offset) for note in notes]
+
+
+def test_band_notes_match_full_page(player, test_cases_dir, tmp_path):
+    image_paths = [os.path.join(test_cases_dir, name) for name in sorted(os.listdir(test_cases_dir))]
+    corpus_path = str(tmp_path / "corpus")
+
+    written = write_staff_corpus(player, image_paths, corpus_path)
+    corpus = StaffCorpus(corpus_path)
+
+    assert written == len(corpus) == len(image_paths)
+    assert [page["image"] for page in corpus.pages] == image_paths
+    for index, page in enumerate(corpus.pages):
+        image_name = os.path.basename(page["image"])
+        resized_image, binary, staff_lines = player.preprocess_page(cv2.imread(page["image"]))
+        page_notes = player.detect_notes_by_intersection(image_name, resized_image, staff_lines, False, binary)
+
+        band, _ = corpus[index]
+        band_top, band_bottom = page["band_top"], page["band_top"] + band.shape[0]
+        assert np.array_equal(band, binary[band_top:band_bottom])
+
+        # Every symbol inside the band is stored whole, stems and flags included
+        _, labels, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        for label in np.unique(labels[band_top:band_bottom])[1:]:
+            assert stats[label, cv2.CC_STAT_TOP] >= band_top
+            assert stats[label, cv2.CC_STAT_TOP] + stats[label, cv2.CC_STAT_HEIGHT] <= band_bottom
+
+        band_notes = corpus.detect_notes(player, index)
+
+        assert summarize(band_notes, band_top) == summarize(page_notes)
+
+
+def test_page_without_full_staff_is_skipped(player, tmp_path):
+    image = np.full((200, 600, 3), 255, np.uint8)
+    image[100:103, 20:580] = 0
+    image_path = str(tmp_path / "one_line.png")
+    cv2.imwrite(image_path, image)
+    corpus_path = str(tmp_path / "corpus")
+
+    assert write_staff_corpus(player, [image_path], corpus_path) == 0
+    with open(f"{corpus_path}.json", "r", encoding="utf-8") as fh:
+        assert json.load(fh) == {"pages": []}
+    assert len(StaffCorpus(corpus_path)) == 0
@@ -0,0 +1,54 @@
+import os
+import cv2
+import numpy as np
+import pytest
+
+
+def test_hollow_head_on_a_line_stays_whole(player):
+    binary = np.zeros((100, 300), np.uint8)
+    binary[48:52, 10:290] = 255
+    # Ring whose bottom arc runs inside the staff line
+    cv2.ellipse(binary, (150, 38), (15, 12), 0, 0, 360, 255, 3)
+    staff_lines = [{"y": 50, "x1": 10, "x2": 290, "width": 280, "height": 4}]
+
+    removed = player.remove_staff_lines(binary, staff_lines)
+
+    contours, _ = cv2.findContours(removed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    assert len(contours) == 1
+    assert not removed[50, 10:120].any() and not removed[50, 180:290].any()
+
+
+@pytest.mark.parametrize("gap", [12, 16, 18, 20, 30])
+def test_stem_next_to_bar_line_adds_no_note(player, gap):
+    page = np.full((300, 800), 255, np.uint8)
+    for i in range(5):
+        page[99 + 25 * i:102 + 25 * i, 50:750] = 0
+    page[100:201, 399:402] = 0
+    # Stem-down C5 whose stem runs down the staff next to the bar line
+    stem = 401 + gap
+    page[138:225, stem:stem + 3] = 0
+    cv2.ellipse(page, (stem + 12, 137), (12, 9), -20, 0, 360, 0, -1)
+    image = cv2.cvtColor(page, cv2.COLOR_GRAY2BGR)
+
+    resized_image, binary, staff_lines = player.preprocess_page(image)
+    notes = player.detect_notes_by_intersection("bar_line.png", resized_image, staff_lines, False, binary)
+
+    assert [(note["note"], note["duration"]) for note in notes] == [("C5", "quarter")]
+
+
+@pytest.mark.parametrize("image_name, expected", [
+    ("c-major.png", "C4q D4q E4q F4q G4q A4q B4q C5q"),
+    ("rock.png", "E4q G4q E5q D5h C5q"),
+    ("sanic.png", "C5q A4q C5q B4q C5q B4q G4q A4q E5q D5q C5q B4q C5q B4q G4q"),
+    ("test_sheet_music_simple.png", "F5q E5q D5q F5q G5q E5q F5q D5h"),
+    ("test_sheet_music_advanced.png", "F5q E5q D5h F5q G5h E5q F5q D5q E5h F5q"),
+])
+def test_only_note_heads_are_detected(player, test_cases_dir, image_name, expected):
+    image = cv2.imread(os.path.join(test_cases_dir, image_name))
+    resized_image, binary, staff_lines = player.preprocess_page(image)
+
+    notes = player.detect_notes_by_intersection(image_name, resized_image, staff_lines, False, binary)
+
+    durations = {"quarter": "q", "half": "h", "whole": "w"}
+    assert " ".join(note["note"] + durations[note["duration"]] for note in notes) == expected
+    assert len({(note["x"], note["y"]) for note in notes}) == len(notes)